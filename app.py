@@ -1,9 +1,19 @@
 # app.py
-from flask import Flask, request, render_template_string
+from flask import Flask, Response, request, render_template_string, stream_with_context
 import requests
 import os
+import json
 import logging
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import student_model
+from instrumentation import span, init_app as init_instrumentation
+from news_aggregator import HeadlineAggregator, RequestQuota
+from history_store import HistoryStore, text_hash
+import long_text
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,8 +29,34 @@ FALLBACK_HEADLINES = [
     "Breakthrough in renewable energy storage technology",
 ]
 
+# Limits for the /aggregate fan-out
+NEWS_API_MAX_CONCURRENCY = int(os.environ.get("NEWS_API_MAX_CONCURRENCY", 8))
+NEWS_API_DAILY_QUOTA = int(os.environ.get("NEWS_API_DAILY_QUOTA", 1000))
+# Shared by every worker process and kept across restarts
+NEWS_API_QUOTA_FILE = os.environ.get("NEWS_API_QUOTA_FILE", "./newsapi_quota.json")
+MAX_AGGREGATE_QUERIES = 30
+MAX_AGGREGATE_REQUESTS = 30  # per /aggregate call, so one caller cannot drain the daily quota
+MAX_AGGREGATE_PAGES = 5
+MAX_AGGREGATE_PAGE_SIZE = 100  # NewsAPI's own pageSize cap
+
+# Prediction cache and classification history
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 5000))
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "./history")
+MAX_HISTORY_RECORDS = 1000
+
+# /classify bodies longer than this go through token-window chunking (long_text.py)
+LONG_TEXT_THRESHOLD = 512
+# Model time budget per long /classify request. hf_predict_batch can overrun it by at most one
+# socket read (HF_BATCH_MAX_READ_TIMEOUT), so the sum stays under gunicorn's 30 s worker timeout.
+LONG_TEXT_TIME_BUDGET = 15.0
+HF_BATCH_CONNECT_TIMEOUT = 3.0
+HF_BATCH_MAX_READ_TIMEOUT = 10.0
+
 # ---------------- FLASK APP ----------------
 app = Flask(__name__)
+# Reject huge bodies before JSON parsing; long texts are capped further in long_text.py
+app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024
+init_instrumentation(app)
 
 # ---------------- HF PREDICT SETUP ----------------
 HF_TOKEN = os.environ.get("HF_TOKEN")
@@ -35,6 +71,37 @@ headers = {
     "Content-Type": "application/json"
 }
 
+# ---------------- LOCAL STUDENT MODEL ----------------
+# Optional distilled classifier from distill_model.py; when loaded it replaces
+# the Hugging Face API call so classification stays in-process.
+STUDENT_MODEL_PATH = os.environ.get("STUDENT_MODEL_PATH")
+student = None
+if STUDENT_MODEL_PATH:
+    try:
+        student = student_model.load(STUDENT_MODEL_PATH)
+        logger.info(f"Loaded student model from {STUDENT_MODEL_PATH}")
+    except Exception as e:
+        logger.error(f"Could not load student model {STUDENT_MODEL_PATH}: {e}")
+
+def classifier_backend():
+    """Name of the backend hf_predict will use"""
+    if student is not None:
+        return "student"
+    return "huggingface" if HF_TOKEN else "keyword-fallback"
+
+def active_model_id():
+    """Model identifier stored with each prediction in the history"""
+    if student is not None:
+        return f"student:{STUDENT_MODEL_PATH}"
+    return model_id if HF_TOKEN else "keyword-fallback"
+
+# Set by hf_predict when the HF API failed and the keyword fallback answered instead
+_prediction_state = threading.local()
+
+def _degraded_fallback(text):
+    _prediction_state.degraded = True
+    return smart_fallback_classification(text)
+
 def smart_fallback_classification(text):
     """Smart fallback classification specifically tuned for fake news detection"""
     if not text:
@@ -92,6 +159,12 @@ def smart_fallback_classification(text):
 
 def hf_predict(text):
     """Classify news headline using Hugging Face model"""
+    _prediction_state.degraded = False
+    if student is not None:
+        if not text or text == "[Removed]":
+            return "UNVERIFIED", 0.0
+        return student.predict(text)
+
     if not HF_TOKEN:
         logger.warning("HF_TOKEN not set, using fallback")
         return smart_fallback_classification(text)
@@ -106,13 +179,13 @@ def hf_predict(text):
         
         if response.status_code == 404:
             logger.error(f"Model {model_id} not found, using fallback")
-            return smart_fallback_classification(text)
+            return _degraded_fallback(text)
         elif response.status_code == 503:
             logger.info("Model is loading, please try again in a few seconds")
             return "LOADING", 50.0
         elif response.status_code != 200:
             logger.error(f"HF API Error {response.status_code}: {response.text}")
-            return smart_fallback_classification(text)
+            return _degraded_fallback(text)
 
         data = response.json()
         
@@ -131,75 +204,229 @@ def hf_predict(text):
                 
         else:
             logger.warning(f"Unexpected response format: {data}")
-            return smart_fallback_classification(text)
+            return _degraded_fallback(text)
 
     except requests.exceptions.Timeout:
         logger.error("HF API request timeout")
-        return smart_fallback_classification(text)
+        return _degraded_fallback(text)
     except Exception as e:
         logger.error(f"Error in hf_predict: {e}")
-        return smart_fallback_classification(text)
+        return _degraded_fallback(text)
+
+def _map_hf_prediction(prediction):
+    """Map one HF text-classification result (dict, or list of label scores) to (label, confidence)"""
+    if isinstance(prediction, list):
+        prediction = max(prediction, key=lambda p: p.get('score', 0.0))
+    label = prediction.get('label', 'UNKNOWN')
+    score = prediction.get('score', 0.0)
+    if label.upper() in ['FAKE', 'LABEL_1', 'INACCURATE']:
+        return "FAKE", round(score * 100, 2)
+    return "REAL", round(score * 100, 2)
+
+def hf_predict_batch(texts, timeout=30):
+    """Classify several texts with one backend call; same result shape as hf_predict per text.
+
+    Unlike hf_predict there is no per-call keyword fallback: a failed API
+    call returns None so the caller never mixes keyword and model scores.
+
+    `timeout` is a deadline for the whole call, enforced best-effort:
+    requests only times out individual connects and socket reads, so the
+    body is streamed and abandoned once the deadline passes. A read that
+    stalls right before the deadline can still overrun it by up to
+    HF_BATCH_MAX_READ_TIMEOUT.
+    """
+    if student is not None:
+        return [student.predict(t) for t in texts]
+    if not HF_TOKEN:
+        return [smart_fallback_classification(t) for t in texts]
+
+    deadline = time.monotonic() + timeout
+    read_timeout = min(timeout, HF_BATCH_MAX_READ_TIMEOUT)
+    try:
+        with requests.post(
+            API_URL, headers=headers, json={"inputs": texts},
+            timeout=(min(timeout, HF_BATCH_CONNECT_TIMEOUT), read_timeout), stream=True
+        ) as response:
+            if response.status_code == 503:
+                logger.info("Model is loading, please try again in a few seconds")
+                return [("LOADING", 50.0)] * len(texts)
+            elif response.status_code != 200:
+                logger.error(f"HF API Error {response.status_code}: {response.reason}")
+                return None
+
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=8192):
+                body += chunk
+                if time.monotonic() > deadline:
+                    logger.error("HF API batch response exceeded the long-text deadline")
+                    return None
+        data = json.loads(body)
+        if isinstance(data, list) and len(data) == len(texts):
+            return [_map_hf_prediction(prediction) for prediction in data]
+        logger.warning(f"Unexpected batch response format: {data}")
+        return None
+
+    except requests.exceptions.Timeout:
+        logger.error("HF API batch request timeout")
+        return None
+    except Exception as e:
+        logger.error(f"Error in hf_predict_batch: {e}")
+        return None
 
 # ---------------- HELPERS ----------------
-def get_latest_headlines(query="", page_size=6):
-    """Fetch latest headlines from NewsAPI"""
+def fetch_news_page(query="", page=1, page_size=6, published_after=None):
+    """Fetch one page of raw NewsAPI articles; raises on HTTP errors"""
     if query:
         # Use everything endpoint for search queries
         base_url = "https://newsapi.org/v2/everything"
         params = {
             "apiKey": NEWS_API_KEY,
             "pageSize": page_size, 
+            "page": page,
             "language": "en",
-            "sortBy": "relevancy",
+            # Newest-first for incremental polls; the aggregator only advances the cursor
+            # once pagination reached back to it
+            "sortBy": "publishedAt" if published_after else "relevancy",
             "q": query
         }
+        if published_after:
+            params["from"] = published_after
     else:
-        # Use top-headlines for general news
+        # Use top-headlines for general news (no `from` support; filtered by the caller)
         base_url = "https://newsapi.org/v2/top-headlines"
         params = {
             "apiKey": NEWS_API_KEY,
             "pageSize": page_size, 
+            "page": page,
             "language": "en",
             "country": "us"
         }
-        
+
+    response = requests.get(base_url, params=params, timeout=10)
+    logger.info(f"NewsAPI request to: {base_url}")
+
+    if response.status_code != 200:
+        raise RuntimeError(f"NewsAPI error {response.status_code}: {response.text}")
+    return response.json().get("articles", [])
+
+def process_article(article):
+    """Turn a raw NewsAPI article into a headline dict, or None if it has no usable title"""
+    title = (article.get("title") or "").strip()
+    if not title or title == "[Removed]":
+        return None
+
+    published = article.get("publishedAt", "")
+    if published:
+        try:
+            # Format date nicely
+            date_obj = datetime.fromisoformat(published.replace('Z', '+00:00'))
+            published = date_obj.strftime("%b %d, %Y")
+        except:
+            published = published[:10]
+    else:
+        published = "Recent"
+
+    return {
+        "title": title,
+        "source": (article.get("source") or {}).get("name", "Unknown"),
+        "published": published,
+        "url": article.get("url", "")
+    }
+
+def get_latest_headlines(query="", page_size=6):
+    """Fetch latest headlines from NewsAPI"""
     try:
-        response = requests.get(base_url, params=params, timeout=10)
-        logger.info(f"NewsAPI request to: {base_url}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            articles = data.get("articles", [])
-            logger.info(f"Found {len(articles)} articles")
-            
-            processed_articles = []
+        with span("newsapi"):
+            articles = news_aggregator.fetch(query, page_size=page_size)
+        logger.info(f"Found {len(articles)} articles")
+
+        processed_articles = []
+        with span("parse"):
             for article in articles:
-                title = article.get("title", "").strip()
-                if title and title != "[Removed]":
-                    published = article.get("publishedAt", "")
-                    if published:
-                        try:
-                            # Format date nicely
-                            date_obj = datetime.fromisoformat(published.replace('Z', '+00:00'))
-                            published = date_obj.strftime("%b %d, %Y")
-                        except:
-                            published = published[:10]
-                    else:
-                        published = "Recent"
-                        
-                    processed_articles.append({
-                        "title": title,
-                        "source": article.get("source", {}).get("name", "Unknown"),
-                        "published": published
-                    })
-            return processed_articles
-        else:
-            logger.error(f"NewsAPI error {response.status_code}: {response.text}")
-            return []
+                headline = process_article(article)
+                if headline:
+                    processed_articles.append(headline)
+        return processed_articles
     except Exception as e:
         logger.error(f"Error fetching headlines: {e}")
         return []
 
+news_aggregator = HeadlineAggregator(
+    fetch_news_page,
+    process_article,
+    max_concurrency=NEWS_API_MAX_CONCURRENCY,
+    quota=RequestQuota(NEWS_API_DAILY_QUOTA, window_seconds=24 * 60 * 60, path=NEWS_API_QUOTA_FILE),
+)
+
+# ---------------- PREDICTION CACHE & HISTORY ----------------
+prediction_cache = OrderedDict()
+prediction_cache_lock = threading.Lock()
+
+history = None
+try:
+    history = HistoryStore(HISTORY_DIR)
+    # Warm-start the cache from this model's most recent predictions (oldest first, so LRU order holds)
+    recent = history.recent_predictions(active_model_id(), PREDICTION_CACHE_SIZE)
+    prediction_cache.update(reversed(list(recent.items())))
+    logger.info(f"History store at {HISTORY_DIR}: {len(history)} rows, {len(prediction_cache)} cached predictions")
+except Exception as e:
+    logger.error(f"Classification history disabled: {e}")
+
+def classify_headline(text, source="Unknown"):
+    """hf_predict behind the prediction cache; every served prediction is appended to the history"""
+    key = text_hash(text)
+    with prediction_cache_lock:
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            prediction_cache.move_to_end(key)
+    if cached is not None:
+        # Only model answers are cached, so hits are attributed to the active model
+        if history is not None:
+            history.record(text, source, cached[0], cached[1], active_model_id())
+        return cached
+
+    label, confidence = hf_predict(text)
+    if label not in ("REAL", "FAKE"):
+        return label, confidence
+
+    # Keyword answers given because the API failed are neither cached nor attributed to the model
+    degraded = _prediction_state.degraded
+    if not degraded:
+        with prediction_cache_lock:
+            prediction_cache[key] = (label, confidence)
+            if len(prediction_cache) > PREDICTION_CACHE_SIZE:
+                prediction_cache.popitem(last=False)
+    if history is not None:
+        history.record(text, source, label, confidence, "keyword-fallback" if degraded else active_model_id())
+    return label, confidence
+
+def classify_article(text, source="custom"):
+    """Bounded-cost classification of a long body via token windows; returns (label, confidence, details)"""
+    label, confidence, details = long_text.classify_long_text(
+        text, hf_predict_batch, time_budget=LONG_TEXT_TIME_BUDGET
+    )
+    used_model = active_model_id()
+    if label == "UNVERIFIED" and details["stopped"] in ("failed", "deadline"):
+        # No window was scored by the model; answer from keywords over the capped text alone
+        label, confidence = smart_fallback_classification(text[:long_text.MAX_TEXT_CHARS])
+        details["keyword_fallback"] = True
+        used_model = "keyword-fallback"
+
+    if history is not None and label in ("REAL", "FAKE"):
+        history.record(text[:long_text.MAX_TEXT_CHARS], source, label, confidence, used_model)
+    return label, confidence, details
+
+def parse_history_time(value, end_of_day=False):
+    """Parse a YYYY-MM-DD or ISO 8601 query parameter into epoch seconds (UTC if no offset)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1, microseconds=-1)
+    return parsed.timestamp()
+
 def create_fallback_results(query=""):
     """Create fallback results when no news is found"""
     if query:
@@ -240,7 +467,8 @@ def home():
 
         # Classify each headline
         for headline in headlines:
-            label, confidence = hf_predict(headline["title"])
+            with span("predict"):
+                label, confidence = classify_headline(headline["title"], headline.get("source", "Unknown"))
             results.append({
                 "title": headline["title"],
                 "source": headline.get("source", "Unknown"),
@@ -255,7 +483,8 @@ def home():
         # Still show fallback results even on error
         headlines = create_fallback_results(query)
         for headline in headlines:
-            label, confidence = hf_predict(headline["title"])
+            with span("predict"):
+                label, confidence = classify_headline(headline["title"], headline.get("source", "Unknown"))
             results.append({
                 "title": headline["title"],
                 "source": headline.get("source", "Unknown"),
@@ -264,13 +493,14 @@ def home():
                 "confidence": confidence
             })
 
-    return render_template_string(
-        HTML_TEMPLATE, 
-        results=results, 
-        query=query, 
-        error_msg=error_msg,
-        hf_token_configured=bool(HF_TOKEN)
-    )
+    with span("render"):
+        return render_template_string(
+            HTML_TEMPLATE, 
+            results=results, 
+            query=query, 
+            error_msg=error_msg,
+            hf_token_configured=bool(HF_TOKEN)
+        )
 
 @app.route("/classify", methods=["POST"])
 def classify_text():
@@ -281,7 +511,20 @@ def classify_text():
     if not text:
         return {"error": "No text provided"}, 400
     
-    label, confidence = hf_predict(text)
+    if len(text) > LONG_TEXT_THRESHOLD or data.get("mode") == "long":
+        with span("predict"):
+            label, confidence, details = classify_article(text)
+        return {
+            # Echo a prefix rather than the whole pasted article
+            "text": text[:LONG_TEXT_THRESHOLD],
+            "label": label,
+            "confidence": confidence,
+            "long_text": details,
+            "is_demo": not bool(HF_TOKEN)
+        }
+
+    with span("predict"):
+        label, confidence = classify_headline(text, source="custom")
     
     return {
         "text": text,
@@ -290,6 +533,79 @@ def classify_text():
         "is_demo": not bool(HF_TOKEN)
     }
 
+@app.route("/aggregate", methods=["POST"])
+def aggregate_headlines():
+    """Fetch many queries/pages concurrently and stream classified headlines as NDJSON"""
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries") or [""]
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return {"error": "queries must be a list of strings"}, 400
+    queries = [q.strip() for q in queries][:MAX_AGGREGATE_QUERIES]
+
+    try:
+        pages = max(1, min(int(data.get("pages", 1)), MAX_AGGREGATE_PAGES))
+        page_size = max(1, min(int(data.get("page_size", 50)), MAX_AGGREGATE_PAGE_SIZE))
+        max_requests = max(1, min(int(data.get("max_requests", MAX_AGGREGATE_REQUESTS)), MAX_AGGREGATE_REQUESTS))
+    except (TypeError, ValueError):
+        return {"error": "pages, page_size and max_requests must be integers"}, 400
+
+    # Clients keep their own publishedAt cursor per query and send it back on the next poll
+    cursors = data.get("cursors") or {}
+    if not isinstance(cursors, dict) or not all(isinstance(v, str) for v in cursors.values()):
+        return {"error": "cursors must map queries to publishedAt strings"}, 400
+    cursors = {q: cursors[q] for q in queries if cursors.get(q)}
+
+    incomplete = set()
+
+    def generate():
+        for headline in news_aggregator.stream(
+            queries, pages=pages, page_size=page_size,
+            cursors=cursors, max_requests=max_requests, incomplete=incomplete
+        ):
+            label, confidence = classify_headline(headline["title"], headline.get("source", "Unknown"))
+            headline.update(label=label, confidence=confidence)
+            yield json.dumps(headline) + "\n"
+        # Only sent once every article was delivered, so a dropped stream just repeats the poll
+        yield json.dumps({"cursors": cursors, "incomplete": sorted(incomplete)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/history")
+def history_summary():
+    """Label mix per source per day, e.g. /history?start=2025-01-01&end=2025-01-31&source=BBC News"""
+    if history is None:
+        return {"error": "History store is not available"}, 503
+    try:
+        start = parse_history_time(request.args.get("start"))
+        end = parse_history_time(request.args.get("end"), end_of_day=True)
+    except ValueError:
+        return {"error": "start and end must be YYYY-MM-DD or ISO 8601 timestamps"}, 400
+
+    started = time.perf_counter()
+    label_mix = history.label_mix(start, end, source=request.args.get("source"), label=request.args.get("label"))
+    return {
+        "label_mix": label_mix,
+        "total_rows": len(history),
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@app.route("/history/records")
+def history_records():
+    """Newest-first stored predictions filtered by time range, source and label"""
+    if history is None:
+        return {"error": "History store is not available"}, 503
+    try:
+        start = parse_history_time(request.args.get("start"))
+        end = parse_history_time(request.args.get("end"), end_of_day=True)
+        limit = max(1, min(int(request.args.get("limit", 100)), MAX_HISTORY_RECORDS))
+    except ValueError:
+        return {"error": "Invalid start, end or limit"}, 400
+
+    records = history.records(
+        start, end, source=request.args.get("source"), label=request.args.get("label"), limit=limit
+    )
+    return {"records": records, "count": len(records)}
+
 @app.route("/test-classify")
 def test_classify():
     """Test endpoint to verify classification is working"""
@@ -317,6 +633,7 @@ def test_classify():
     return {
         "test_results": results,
         "hf_token_configured": bool(HF_TOKEN),
+        "backend": classifier_backend(),
         "model": model_id,
         "api_url": API_URL
     }
@@ -329,7 +646,12 @@ def debug():
         "hf_token_length": len(os.environ.get("HF_TOKEN", "")),
         "model_id": model_id,
         "api_url": API_URL,
-        "news_api_key_set": bool(NEWS_API_KEY)
+        "backend": classifier_backend(),
+        "student_model_path": STUDENT_MODEL_PATH,
+        "news_api_key_set": bool(NEWS_API_KEY),
+        "news_api_quota_remaining": news_aggregator.quota.remaining(),
+        "prediction_cache_size": len(prediction_cache),
+        "history_rows": len(history) if history is not None else None
     }
     return debug_info
 
@@ -0,0 +1,226 @@
+"""Inference throughput benchmark for the model saved by train_model.py.
+
+Sweeps batch size, max sequence length, torch intra-op threads and length
+bucketing over real headlines, reports headlines/sec, p50/p99 latency,
+peak RSS and truncation rate per configuration, and recommends a serving
+configuration whose max length covers the p99 headline token length.
+
+    python benchmark_model.py --cores 4 --output bench.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+MODEL_DIR = "./models/fake_news_model"
+
+
+def load_headlines(sample_size, seed=42):
+    """Sample real titles from the training corpus"""
+    import pandas as pd
+
+    fake = pd.read_csv("data/Fake.csv")
+    true = pd.read_csv("data/True.csv")
+    titles = pd.concat([fake["title"], true["title"]], ignore_index=True).dropna().tolist()
+    random.Random(seed).shuffle(titles)
+    return titles[:sample_size]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def token_lengths(model_dir, headlines):
+    """Untruncated token counts (including special tokens) per headline"""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return [len(ids) for ids in tokenizer(headlines)["input_ids"]]
+
+
+def run_config(config, model_dir, headlines, warmup_batches):
+    """Benchmark one configuration; runs in a fresh process so threads and RSS are isolated"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    torch.set_num_threads(config["threads"])
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+
+    texts = list(headlines)
+    if config["bucketing"]:
+        # Sort by length only within fixed arrival windows, as a server could while
+        # collecting requests; sorting the whole sample would overstate the gain
+        lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=config["max_length"])["input_ids"]]
+        window = config["bucket_window"]
+        bucketed = []
+        for i in range(0, len(texts), window):
+            arrivals = sorted(zip(lengths[i:i + window], texts[i:i + window]), key=lambda pair: pair[0])
+            bucketed.extend(t for _, t in arrivals)
+        texts = bucketed
+
+    batch_size = config["batch_size"]
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def infer(batch):
+        enc = tokenizer(batch, truncation=True, padding=True, max_length=config["max_length"], return_tensors="pt")
+        with torch.inference_mode():
+            model(**enc)
+
+    for batch in batches[:warmup_batches]:
+        infer(batch)
+
+    latencies = []
+    start = time.perf_counter()
+    for batch in batches:
+        batch_start = time.perf_counter()
+        infer(batch)
+        # Every headline in a batch waits for the whole batch
+        latencies.extend([(time.perf_counter() - batch_start) * 1000] * len(batch))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    return dict(
+        config,
+        headlines_per_sec=round(len(texts) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 50), 2),
+        p99_ms=round(percentile(latencies, 99), 2),
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def recommend(results, cores, p99_budget_ms, min_max_length):
+    """Pick the config with the best aggregate throughput on `cores` within the p99 budget.
+
+    Only max lengths of at least `min_max_length` (the p99 headline token
+    length) qualify, so speed is never bought by cutting headlines short.
+    Cores not used by one process's intra-op threads are filled with extra
+    worker processes (e.g. gunicorn --workers), so throughput scales by
+    cores // threads.
+    """
+    candidates = []
+    for r in results:
+        if r["threads"] > cores or r["p99_ms"] > p99_budget_ms or r["max_length"] < min_max_length:
+            continue
+        workers = cores // r["threads"]
+        candidates.append(dict(
+            r,
+            workers=workers,
+            estimated_headlines_per_sec=round(r["headlines_per_sec"] * workers, 1),
+            estimated_peak_rss_mb=round(r["peak_rss_mb"] * workers, 1),
+        ))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: (c["estimated_headlines_per_sec"], -c["p99_ms"]))
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fine-tuned fake news model")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--samples", type=int, default=512, help="headlines per configuration")
+    parser.add_argument("--batch-sizes", type=parse_int_list, default=[1, 8, 32])
+    parser.add_argument("--max-lengths", type=parse_int_list, default=[32, 64, 128])
+    parser.add_argument("--threads", type=parse_int_list, default=None,
+                        help="intra-op thread counts (default: 1, 2, 4 up to the CPU count)")
+    parser.add_argument("--warmup-batches", type=int, default=3)
+    parser.add_argument("--bucket-window", type=int, default=64,
+                        help="headlines per arrival window that bucketing may reorder")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="cores to recommend a config for")
+    parser.add_argument("--p99-budget-ms", type=float, default=500.0)
+    parser.add_argument("--output", help="write JSON results to this path (default: stdout)")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    threads = args.threads or [t for t in (1, 2, 4, 8) if t <= cpu_count]
+    headlines = load_headlines(args.samples)
+
+    lengths = sorted(token_lengths(args.model_dir, headlines))
+    p99_tokens = percentile(lengths, 99)
+    truncation_rates = {
+        m: round(sum(1 for n in lengths if n > m) / len(lengths), 4) for m in args.max_lengths
+    }
+    # If no swept length covers the p99, fall back to the longest one swept
+    min_max_length = min(p99_tokens, max(args.max_lengths))
+
+    configs = [
+        {"batch_size": b, "max_length": m, "threads": t, "bucketing": bucket, "bucket_window": args.bucket_window}
+        for b, m, t, bucket in itertools.product(args.batch_sizes, args.max_lengths, threads, (False, True))
+        # Bucketing only changes anything when batches hold several headlines
+        if b > 1 or not bucket
+    ]
+
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+    for i, config in enumerate(configs, 1):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(run_config, config, args.model_dir, headlines, args.warmup_batches).result()
+        result["truncation_rate"] = truncation_rates[config["max_length"]]
+        results.append(result)
+        print(
+            f"[{i}/{len(configs)}] batch={config['batch_size']} max_len={config['max_length']} "
+            f"threads={config['threads']} bucketing={config['bucketing']}: "
+            f"{result['headlines_per_sec']} headlines/s, p50 {result['p50_ms']}ms, "
+            f"p99 {result['p99_ms']}ms, rss {result['peak_rss_mb']}MB, "
+            f"truncated {result['truncation_rate']:.1%}",
+            file=sys.stderr,
+        )
+
+    import torch
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "model_dir": args.model_dir,
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": cpu_count,
+        },
+        "samples": len(headlines),
+        "token_lengths": {
+            "p50": percentile(lengths, 50),
+            "p99": p99_tokens,
+            "max": lengths[-1],
+        },
+        "truncation_rate_by_max_length": truncation_rates,
+        "results": results,
+        "recommendation": {
+            "cores": args.cores,
+            "p99_budget_ms": args.p99_budget_ms,
+            "min_max_length": min_max_length,
+            "config": recommend(results, args.cores, args.p99_budget_ms, min_max_length),
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"✅ Benchmark results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from sklearn.model_selection import train_test_split
+import pandas as pd
+import torch
+import torch.nn.functional as F
+import json
+import os
+import random
+import time
+
+from student_model import StudentClassifier, hashed_features, DEFAULT_NUM_BUCKETS
+
+TEACHER_DIR = "./models/fake_news_model"
+STUDENT_DIR = "./models/student_model"
+TEMPERATURE = 2.0
+ALPHA = 0.7  # weight of the teacher's soft labels vs. the hard labels
+EPOCHS = 5
+BATCH_SIZE = 256
+LATENCY_SAMPLES = 500
+
+torch.manual_seed(42)
+random.seed(42)
+
+# Step 1: Load data (same corpus and split as train_model.py)
+fake = pd.read_csv("data/Fake.csv")
+true = pd.read_csv("data/True.csv")
+
+fake["label"] = 0
+true["label"] = 1
+
+data = pd.concat([fake, true], ignore_index=True)
+data = data.sample(frac=1, random_state=42).reset_index(drop=True)
+data.dropna(subset=["title"], inplace=True)
+
+texts = data["title"].tolist()
+labels = data["label"].tolist()
+
+train_texts, test_texts, train_labels, test_labels = train_test_split(
+    texts, labels, test_size=0.2, random_state=42
+)
+
+# Step 2: Load teacher
+tokenizer = AutoTokenizer.from_pretrained(TEACHER_DIR)
+teacher = AutoModelForSequenceClassification.from_pretrained(TEACHER_DIR)
+teacher.eval()
+
+def teacher_logits(batch_texts):
+    enc = tokenizer(batch_texts, truncation=True, padding=True, max_length=128, return_tensors="pt")
+    with torch.no_grad():
+        return teacher(**enc).logits
+
+# Step 3: Soft labels from the teacher over the training titles
+print("Scoring training set with teacher...")
+soft_targets = []
+for i in range(0, len(train_texts), 64):
+    logits = teacher_logits(train_texts[i:i + 64])
+    soft_targets.append(F.softmax(logits / TEMPERATURE, dim=-1)[:, 1])
+soft_targets = torch.cat(soft_targets)
+hard_targets = torch.tensor(train_labels, dtype=torch.float)
+
+# Step 4: Hash features once up front
+train_features = [hashed_features(t, DEFAULT_NUM_BUCKETS) for t in train_texts]
+
+def to_bag(indices):
+    flat, offsets = [], []
+    for i in indices:
+        offsets.append(len(flat))
+        flat.extend(train_features[i])
+    return torch.tensor(flat, dtype=torch.long), torch.tensor(offsets, dtype=torch.long)
+
+# Step 5: Student = sum of hashed n-gram weights + bias (logistic regression)
+student = torch.nn.EmbeddingBag(DEFAULT_NUM_BUCKETS, 1, mode="sum")
+torch.nn.init.zeros_(student.weight)
+bias = torch.nn.Parameter(torch.zeros(1))
+optimizer = torch.optim.Adam(list(student.parameters()) + [bias], lr=0.01)
+
+# Step 6: Distill
+order = list(range(len(train_texts)))
+for epoch in range(EPOCHS):
+    random.shuffle(order)
+    total_loss = 0.0
+    for start in range(0, len(order), BATCH_SIZE):
+        batch = order[start:start + BATCH_SIZE]
+        flat, offsets = to_bag(batch)
+        logits = student(flat, offsets).squeeze(-1) + bias
+        soft_loss = F.binary_cross_entropy_with_logits(logits / TEMPERATURE, soft_targets[batch])
+        hard_loss = F.binary_cross_entropy_with_logits(logits, hard_targets[batch])
+        loss = ALPHA * soft_loss * TEMPERATURE ** 2 + (1 - ALPHA) * hard_loss
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item() * len(batch)
+    print(f"Epoch {epoch + 1}/{EPOCHS} - loss {total_loss / len(order):.4f}")
+
+# Step 7: Export to the dependency-free format the app loads
+weight_vector = student.weight.detach().squeeze(-1).tolist()
+classifier = StudentClassifier(
+    weights={i: w for i, w in enumerate(weight_vector) if w != 0.0},
+    bias=bias.item(),
+    num_buckets=DEFAULT_NUM_BUCKETS,
+    teacher=TEACHER_DIR,
+)
+os.makedirs(STUDENT_DIR, exist_ok=True)
+student_path = os.path.join(STUDENT_DIR, "student.json")
+classifier.save(student_path)
+
+# Step 8: Accuracy vs. latency on test_texts
+print("Evaluating teacher and student on test set...")
+teacher_preds = []
+for i in range(0, len(test_texts), 64):
+    teacher_preds.extend(teacher_logits(test_texts[i:i + 64]).argmax(dim=-1).tolist())
+student_preds = [1 if classifier.real_probability(t) >= 0.5 else 0 for t in test_texts]
+
+def accuracy(preds):
+    return sum(int(p == y) for p, y in zip(preds, test_labels)) / len(test_labels)
+
+def latency_ms(fn, samples):
+    # Single-headline calls, which is how the app classifies
+    timings = []
+    for text in samples:
+        start = time.perf_counter()
+        fn(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50": round(timings[len(timings) // 2], 3),
+        "p99": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        "mean": round(sum(timings) / len(timings), 3),
+    }
+
+latency_texts = test_texts[:LATENCY_SAMPLES]
+report = {
+    "test_size": len(test_texts),
+    "teacher": {
+        "path": TEACHER_DIR,
+        "accuracy": round(accuracy(teacher_preds), 4),
+        "latency_ms": latency_ms(lambda t: teacher_logits([t]), latency_texts),
+    },
+    "student": {
+        "path": student_path,
+        "accuracy": round(accuracy(student_preds), 4),
+        "agreement_with_teacher": round(
+            sum(int(s == t) for s, t in zip(student_preds, teacher_preds)) / len(test_texts), 4
+        ),
+        "latency_ms": latency_ms(classifier.predict, latency_texts),
+        "nonzero_weights": len(classifier.weights),
+    },
+}
+report["speedup_p50"] = round(
+    report["teacher"]["latency_ms"]["p50"] / max(report["student"]["latency_ms"]["p50"], 1e-6), 1
+)
+
+with open(os.path.join(STUDENT_DIR, "report.json"), "w") as f:
+    json.dump(report, f, indent=2)
+
+print(json.dumps(report, indent=2))
+print(f"✅ Student model saved to {student_path}")
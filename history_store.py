@@ -0,0 +1,386 @@
+# history_store.py
+"""Append-only classification history with in-memory indexes.
+
+Layout under the history directory:
+  strings.txt  - interned sources, labels and model ids, one JSON string per line
+  records.bin  - fixed header + UTF-8 title per prediction, appended in batches
+
+Writes are queued by record() and flushed by a background thread, so the
+request path only pays for a queue put. Each batch is written under an
+exclusive flock after catching up on anything other worker processes
+appended, so several gunicorn workers can share one directory.
+
+Every process keeps row-level time/source/label indexes plus per-day
+(source, label) counters, which answer label-mix queries without touching
+disk regardless of how many rows are stored.
+"""
+import atexit
+import hashlib
+import heapq
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:  # Windows; HistoryStore refuses to start rather than the whole app
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# timestamp, text hash, source id, label id, model id, confidence, title length
+RECORD_HEADER = struct.Struct("<dQIIIfH")
+SECONDS_PER_DAY = 86400
+MAX_TITLE_BYTES = 0xFFFF
+READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def text_hash(text):
+    """Stable 64-bit hash of a headline, shared with the prediction cache"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HistoryStore:
+    def __init__(self, directory, batch_size=256, flush_interval=1.0, max_queue=10000):
+        if fcntl is None:
+            raise RuntimeError("HistoryStore needs fcntl file locking, which this platform lacks")
+        self.directory = directory
+        self.strings_path = os.path.join(directory, "strings.txt")
+        self.records_path = os.path.join(directory, "records.bin")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self.strings = []
+        self.string_ids = {}
+        self._strings_size = 0
+        self._records_size = 0
+
+        # Row-level indexes; row numbers are positions in these arrays
+        self.timestamps = array("d")
+        self.offsets = array("Q")
+        # Kept per row so cache warm-start never has to go back to disk
+        self.text_hashes = array("Q")
+        self.source_ids = array("I")
+        self.label_ids = array("I")
+        self.model_ids = array("I")
+        self.confidences = array("f")
+        self.rows_by_source = {}
+        self.rows_by_label = {}
+        # Rows in timestamp order; workers flush independently, so file order is only roughly by time
+        self.sorted_times = array("d")
+        self.sorted_rows = array("I")
+        # day -> {(source id, label id): [count, confidence sum]}, with the days kept sorted
+        self.daily_counts = {}
+        self.days = []
+
+        self.index_lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        for path in (self.strings_path, self.records_path):
+            open(path, "ab").close()
+        with self._file_lock():
+            self._refresh(repair=True)
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True, name="history-writer")
+        self.writer.start()
+        atexit.register(self.close)
+
+    # ---------------- WRITES ----------------
+    def record(self, title, source, label, confidence, model_id, timestamp=None):
+        """Queue one prediction; never blocks the caller"""
+        try:
+            self.queue.put_nowait((timestamp or time.time(), title, source or "Unknown", label, confidence, model_id))
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write_batch(batch)
+                    return
+                batch.append(item)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        try:
+            with self._file_lock():
+                with self.index_lock:
+                    # Pick up strings and rows other processes wrote since our last look
+                    self._refresh(repair=True)
+                    new_strings = {}
+                    payload = bytearray()
+                    for ts, title, source, label, confidence, model_id in batch:
+                        ids = [self._string_id(s, new_strings) for s in (source, label, model_id)]
+                        title_bytes = title.encode("utf-8")[:MAX_TITLE_BYTES]
+                        payload += RECORD_HEADER.pack(
+                            ts, text_hash(title), ids[0], ids[1], ids[2], float(confidence), len(title_bytes)
+                        )
+                        payload += title_bytes
+
+                    # Strings go first so a record never references an unknown id
+                    if new_strings:
+                        with open(self.strings_path, "ab") as f:
+                            f.write("".join(json.dumps(s) + "\n" for s in new_strings).encode("utf-8"))
+                            f.flush()
+                            os.fsync(f.fileno())
+                    with open(self.records_path, "ab") as f:
+                        f.write(payload)
+                        f.flush()
+                    self._refresh()
+        except Exception as e:
+            logger.error(f"Error writing classification history: {e}")
+
+    def _string_id(self, value, new_strings):
+        """Id for `value`, reserving the next free id if it is not in strings.txt yet.
+
+        Ids are only added to the index when _refresh reads them back, which
+        keeps every process's numbering identical to the file's line order.
+        """
+        if value in self.string_ids:
+            return self.string_ids[value]
+        if value not in new_strings:
+            new_strings[value] = len(self.strings) + len(new_strings)
+        return new_strings[value]
+
+    def close(self):
+        """Flush queued records and stop the writer thread"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout=10)
+
+    # ---------------- INDEXING ----------------
+    def _file_lock(self):
+        return _FileLock(self.lock_path)
+
+    def _refresh(self, repair=False):
+        """Index strings and records appended since the last refresh.
+
+        With `repair` (only while holding the file lock) a partial trailing
+        record left by a crashed writer is truncated away.
+        """
+        with self.index_lock:
+            # Writers append strings before the records that use them, so taking the
+            # records size first guarantees every record below it has its strings loaded
+            size = os.path.getsize(self.records_path)
+            if os.path.getsize(self.strings_path) > self._strings_size:
+                with open(self.strings_path, "rb") as f:
+                    f.seek(self._strings_size)
+                    chunk = f.read()
+                complete = chunk[:chunk.rfind(b"\n") + 1]
+                for line in complete.splitlines():
+                    value = json.loads(line)
+                    self.string_ids[value] = len(self.strings)
+                    self.strings.append(value)
+                self._strings_size += len(complete)
+                if repair and len(complete) < len(chunk):
+                    with open(self.strings_path, "r+b") as f:
+                        f.truncate(self._strings_size)
+
+            if size <= self._records_size:
+                return
+            header_size = RECORD_HEADER.size
+            leftover = b""
+            with open(self.records_path, "rb") as f:
+                f.seek(self._records_size)
+                remaining = size - self._records_size
+                # Bounded reads so a multi-million-row file is never held in memory at once
+                while remaining > 0:
+                    data = f.read(min(READ_CHUNK_BYTES, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    chunk = leftover + data
+                    pos = 0
+                    while pos + header_size <= len(chunk):
+                        header = RECORD_HEADER.unpack_from(chunk, pos)
+                        end = pos + header_size + header[6]
+                        if end > len(chunk):
+                            break
+                        self._index_row(self._records_size + pos, *header[:6])
+                        pos = end
+                    self._records_size += pos
+                    leftover = chunk[pos:]
+
+            if repair and leftover:
+                logger.warning(f"Truncating {len(leftover)} bytes of partial history record")
+                with open(self.records_path, "r+b") as f:
+                    f.truncate(self._records_size)
+
+    def _index_row(self, offset, ts, h, source_id, label_id, model_id, confidence):
+        row = len(self.timestamps)
+        self.timestamps.append(ts)
+        self.offsets.append(offset)
+        self.text_hashes.append(h)
+        self.source_ids.append(source_id)
+        self.label_ids.append(label_id)
+        self.model_ids.append(model_id)
+        self.confidences.append(confidence)
+        self.rows_by_source.setdefault(source_id, array("I")).append(row)
+        self.rows_by_label.setdefault(label_id, array("I")).append(row)
+        if not self.sorted_times or ts >= self.sorted_times[-1]:
+            self.sorted_times.append(ts)
+            self.sorted_rows.append(row)
+        else:
+            # Late rows from another worker's batch land near the end, so the insert moves little
+            i = bisect_right(self.sorted_times, ts)
+            self.sorted_times.insert(i, ts)
+            self.sorted_rows.insert(i, row)
+        day = int(ts // SECONDS_PER_DAY)
+        day_counts = self.daily_counts.get(day)
+        if day_counts is None:
+            day_counts = self.daily_counts[day] = {}
+            insort(self.days, day)
+        counts = day_counts.get((source_id, label_id))
+        if counts is None:
+            day_counts[(source_id, label_id)] = [1, confidence]
+        else:
+            counts[0] += 1
+            counts[1] += confidence
+
+    # ---------------- QUERIES ----------------
+    def __len__(self):
+        return len(self.timestamps)
+
+    def label_mix(self, start=None, end=None, source=None, label=None):
+        """Label counts per source per UTC day between start and end (epoch seconds).
+
+        The day range is bisected out of the sorted day list and answered from
+        the per-day counters, so cost depends on the (source, label)
+        combinations in those days rather than on the number of rows.
+        """
+        with self.index_lock:
+            self._refresh()
+            start_day = int(start // SECONDS_PER_DAY) if start is not None else None
+            end_day = int(end // SECONDS_PER_DAY) if end is not None else None
+            source_id = self.string_ids.get(source) if source else None
+            label_id = self.string_ids.get(label) if label else None
+            if (source and source_id is None) or (label and label_id is None):
+                return {}
+
+            lo = bisect_left(self.days, start_day) if start_day is not None else 0
+            hi = bisect_right(self.days, end_day) if end_day is not None else len(self.days)
+
+            mix = {}
+            for day in self.days[lo:hi]:
+                day_mix = {}
+                for (s_id, l_id), (count, conf_sum) in self.daily_counts[day].items():
+                    if source_id is not None and s_id != source_id:
+                        continue
+                    if label_id is not None and l_id != label_id:
+                        continue
+                    day_mix.setdefault(self.strings[s_id], {})[self.strings[l_id]] = {
+                        "count": count,
+                        "avg_confidence": round(conf_sum / count, 2),
+                    }
+                if day_mix:
+                    mix[time.strftime("%Y-%m-%d", time.gmtime(day * SECONDS_PER_DAY))] = day_mix
+            return mix
+
+    def records(self, start=None, end=None, source=None, label=None, limit=100):
+        """Newest-first rows between start and end (epoch seconds), optionally filtered"""
+        with self.index_lock:
+            self._refresh()
+            lo = bisect_left(self.sorted_times, start) if start is not None else 0
+            hi = bisect_right(self.sorted_times, end) if end is not None else len(self.sorted_times)
+            newest_first = (self.sorted_rows[i] for i in range(hi - 1, lo - 1, -1))
+
+            filters = []
+            for value, index, ids in ((source, self.rows_by_source, self.source_ids),
+                                      (label, self.rows_by_label, self.label_ids)):
+                if value:
+                    string_id = self.string_ids.get(value)
+                    if string_id is None:
+                        return []
+                    filters.append((index.get(string_id, array("I")), ids, string_id))
+
+            if not filters:
+                rows = list(islice(newest_first, limit))
+            else:
+                # Walk whichever is smaller: the time range, or the rarest value's row list
+                smallest = min(filters, key=lambda f: len(f[0]))
+                if hi - lo <= len(smallest[0]):
+                    rows = list(islice(
+                        (r for r in newest_first if all(ids[r] == wanted for _, ids, wanted in filters)),
+                        limit,
+                    ))
+                else:
+                    matches = (
+                        r for r in smallest[0]
+                        if (start is None or self.timestamps[r] >= start)
+                        and (end is None or self.timestamps[r] <= end)
+                        and all(ids[r] == wanted for _, ids, wanted in filters)
+                    )
+                    rows = heapq.nlargest(limit, matches, key=lambda r: (self.timestamps[r], r))
+            return [self._read(self.offsets[row]) for row in rows]
+
+    def recent_predictions(self, model_id, limit):
+        """Newest prediction per text hash for `model_id`, for warming the prediction cache"""
+        with self.index_lock:
+            self._refresh()
+            wanted = self.string_ids.get(model_id)
+            if wanted is None:
+                return {}
+
+            predictions = {}
+            for row in range(len(self.model_ids) - 1, -1, -1):
+                if self.model_ids[row] != wanted:
+                    continue
+                h = self.text_hashes[row]
+                if h not in predictions:
+                    predictions[h] = (self.strings[self.label_ids[row]], round(self.confidences[row], 2))
+                    if len(predictions) >= limit:
+                        break
+            return predictions
+
+    def _read(self, offset):
+        with open(self.records_path, "rb") as f:
+            f.seek(offset)
+            ts, h, source_id, label_id, m_id, confidence, title_len = RECORD_HEADER.unpack(
+                f.read(RECORD_HEADER.size)
+            )
+            title = f.read(title_len).decode("utf-8", errors="replace")
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts)),
+            "text_hash": f"{h:016x}",
+            "title": title,
+            "source": self.strings[source_id],
+            "label": self.strings[label_id],
+            "confidence": round(confidence, 2),
+            "model_id": self.strings[m_id],
+        }
+
+
+class _FileLock:
+    """Exclusive flock across worker processes sharing the history directory"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, "a")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
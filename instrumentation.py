@@ -0,0 +1,162 @@
+# instrumentation.py
+"""Opt-in request timing and an on-demand sampling profiler.
+
+Set REALFEED_TIMING=1 to record per-stage spans for each request and return
+them in a Server-Timing header. When it is unset, span() hands back a shared
+no-op context manager and no request hooks are registered.
+
+Set ADMIN_TOKEN to enable /admin/profile, which samples every thread's stack
+for a few seconds and writes collapsed stacks (flamegraph.pl / speedscope input).
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+TIMING_ENABLED = os.environ.get("REALFEED_TIMING", "").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+MAX_PROFILE_SECONDS = 60
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        spans = g.setdefault("timing_spans", {})
+        # Repeated stages (e.g. one predict per headline) accumulate
+        spans[self.name] = spans.get(self.name, 0.0) + elapsed
+        return False
+
+
+def span(name):
+    """Time a stage of the current request, e.g. `with span("newsapi"): ...`"""
+    if not TIMING_ENABLED:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def _start_request_timer():
+    g.timing_start = time.perf_counter()
+
+
+def _add_server_timing(response):
+    spans = g.get("timing_spans", {})
+    entries = [f"{name};dur={duration:.1f}" for name, duration in spans.items()]
+    start = g.get("timing_start")
+    if start is not None:
+        entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+    if entries:
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+# ---------------- SAMPLING PROFILER ----------------
+class SamplingProfiler:
+    """Samples all thread stacks via sys._current_frames at a fixed interval"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.running = False
+        self.last_result = None
+
+    def start(self, seconds):
+        with self.lock:
+            if self.running:
+                return False
+            self.running = True
+        threading.Thread(target=self._run, args=(seconds,), daemon=True, name="sampling-profiler").start()
+        return True
+
+    def _run(self, seconds):
+        own_id = threading.get_ident()
+        samples = Counter()
+        deadline = time.monotonic() + seconds
+        taken = 0
+        try:
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    samples[";".join(reversed(stack))] += 1
+                taken += 1
+                time.sleep(self.interval)
+            self.last_result = self._dump(samples, seconds, taken)
+        finally:
+            with self.lock:
+                self.running = False
+
+    def _dump(self, samples, seconds, taken):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return {"path": path, "seconds": seconds, "samples": taken, "stacks": len(samples)}
+
+
+profiler = SamplingProfiler()
+
+
+def _authorized():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def admin_profile():
+    """POST starts a profile for ?seconds=N; GET reports the last result"""
+    if not ADMIN_TOKEN:
+        return {"error": "Not found"}, 404
+    if not _authorized():
+        return {"error": "Unauthorized"}, 401
+
+    if request.method == "GET":
+        return {"running": profiler.running, "last_result": profiler.last_result}
+
+    try:
+        seconds = float(request.args.get("seconds", 10))
+    except ValueError:
+        return {"error": "seconds must be a number"}, 400
+    seconds = max(0.1, min(seconds, MAX_PROFILE_SECONDS))
+
+    if not profiler.start(seconds):
+        return {"error": "A profile is already running"}, 409
+    return {"status": "started", "seconds": seconds, "output_dir": PROFILE_DIR}, 202
+
+
+def init_app(app):
+    """Register timing hooks (only when enabled) and the admin profiler route"""
+    if TIMING_ENABLED:
+        app.before_request(_start_request_timer)
+        app.after_request(_add_server_timing)
+    app.add_url_rule("/admin/profile", "admin_profile", admin_profile, methods=["GET", "POST"])
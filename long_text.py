@@ -0,0 +1,147 @@
+# long_text.py
+"""Bounded-cost classification of long article bodies.
+
+Input is capped at MAX_TEXT_CHARS, split into overlapping token windows, and
+at most MAX_WINDOWS of them (spread across the article) are classified in
+batches. Window probabilities are averaged into one label, and classification
+stops as soon as the running average is decisively on one side, so the cost
+of a request is bounded by MAX_WINDOWS model inputs, and its time by one
+overall budget that the backend enforces best-effort, whatever the body size.
+"""
+import math
+import re
+import time
+
+MAX_TEXT_CHARS = 20000
+WINDOW_TOKENS = 128
+WINDOW_STRIDE = 96  # 32 tokens of overlap between consecutive windows
+MAX_WINDOWS = 16
+WINDOW_BATCH_SIZE = 4
+DECISIVE_MARGIN = 0.15
+TIME_BUDGET_SECONDS = 15.0
+MIN_CALL_SECONDS = 1.0  # don't start a batch call with less time than this left
+
+# Word pieces and standalone punctuation, roughly how the BERT tokenizer splits text
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def split_windows(text, window_tokens=WINDOW_TOKENS, stride=WINDOW_STRIDE):
+    """Split text into overlapping windows of about `window_tokens` tokens"""
+    spans = [m.span() for m in _TOKEN.finditer(text)]
+    if not spans:
+        return []
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window_tokens, len(spans))
+        windows.append(text[spans[start][0]:spans[end - 1][1]])
+        if end == len(spans):
+            return windows
+        start += stride
+
+
+def spread_order(n):
+    """Indices 0..n-1 in coarse-to-fine order, so every prefix is spread across the range"""
+    order = []
+    seen = set()
+    step = n
+    while len(order) < n:
+        for i in range(0, n, max(step, 1)):
+            if i not in seen:
+                seen.add(i)
+                order.append(i)
+        step //= 2
+    return order
+
+
+def select_windows(windows, max_windows=MAX_WINDOWS):
+    """Keep at most `max_windows`, evenly spaced, always including the lede"""
+    if len(windows) <= max_windows:
+        return windows
+    step = (len(windows) - 1) / (max_windows - 1)
+    return [windows[round(i * step)] for i in range(max_windows)]
+
+
+def fake_probability(label, confidence):
+    """Convert a (label, confidence %) prediction into P(FAKE), or None if undecided"""
+    if label == "FAKE":
+        return confidence / 100
+    if label == "REAL":
+        return 1 - confidence / 100
+    return None
+
+
+def is_decisive(probabilities, margin=DECISIVE_MARGIN):
+    """True when the mean P(FAKE) sits clearly on one side of 0.5.
+
+    Uses the mean minus two standard errors, so a few disagreeing windows
+    keep the loop going while a consistent article stops after one batch.
+    """
+    n = len(probabilities)
+    if n < 2:
+        return False
+    mean = sum(probabilities) / n
+    variance = sum((p - mean) ** 2 for p in probabilities) / (n - 1)
+    stderr = math.sqrt(variance / n)
+    return abs(mean - 0.5) - 2 * stderr >= margin
+
+
+def classify_long_text(text, classify_batch, max_chars=MAX_TEXT_CHARS, max_windows=MAX_WINDOWS,
+                       batch_size=WINDOW_BATCH_SIZE, time_budget=TIME_BUDGET_SECONDS):
+    """Classify a long text through `classify_batch(texts, timeout) -> [(label, confidence), ...]`.
+
+    `classify_batch` returns None when the backend call failed. Each call is
+    given the time left in `time_budget` as its deadline, and no call starts
+    with less than MIN_CALL_SECONDS left, so the total overruns the budget
+    only by however far the backend overruns its own deadline. The loop
+    stops at the first failed or LOADING batch rather than retrying.
+
+    Returns (label, confidence, details) where confidence is the averaged
+    window probability of the winning label, in percent. details["stopped"]
+    is None, "early", "deadline", "failed" or "loading".
+    """
+    truncated = len(text) > max_chars
+    windows = select_windows(split_windows(text[:max_chars]), max_windows)
+    details = {
+        "windows_total": len(windows),
+        "windows_classified": 0,
+        "stopped": None,
+        "truncated": truncated,
+    }
+    if not windows:
+        return "UNVERIFIED", 0.0, details
+
+    deadline = time.monotonic() + time_budget
+    ordered = [windows[i] for i in spread_order(len(windows))]
+    probabilities = []
+    for start in range(0, len(ordered), batch_size):
+        remaining = deadline - time.monotonic()
+        if remaining < MIN_CALL_SECONDS:
+            details["stopped"] = "deadline"
+            break
+        batch = ordered[start:start + batch_size]
+        results = classify_batch(batch, remaining)
+        if results is None:
+            details["stopped"] = "failed"
+            break
+        if any(label == "LOADING" for label, _ in results):
+            details["stopped"] = "loading"
+            break
+        for label, confidence in results:
+            p_fake = fake_probability(label, confidence)
+            if p_fake is not None:
+                probabilities.append(p_fake)
+        details["windows_classified"] += len(batch)
+        if details["windows_classified"] < len(ordered) and is_decisive(probabilities):
+            details["stopped"] = "early"
+            break
+
+    if not probabilities:
+        # Nothing was scored (model loading, API failure or no time left); surface that state
+        return ("LOADING" if details["stopped"] == "loading" else "UNVERIFIED"), 0.0, details
+
+    # Averaging probabilities (not logits or votes) keeps one overconfident window from dominating
+    p_fake = sum(probabilities) / len(probabilities)
+    if p_fake > 0.5:
+        return "FAKE", round(p_fake * 100, 2), details
+    return "REAL", round((1 - p_fake) * 100, 2), details
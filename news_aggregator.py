@@ -0,0 +1,245 @@
+# news_aggregator.py
+"""Concurrent multi-query, multi-page NewsAPI fan-out.
+
+HeadlineAggregator fetches several queries (and several pages per query) in
+parallel, merges and dedupes the articles by URL and title, and yields them
+as soon as each page arrives so callers can classify while fetching continues.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows; RequestQuota falls back to a per-process budget
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_url(url):
+    """Scheme/query/fragment-insensitive URL key (drops tracking parameters)"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+def normalize_title(title):
+    """Case/whitespace-insensitive title key without NewsAPI's ' - Source' suffix"""
+    title = _WHITESPACE.sub(" ", title.strip().lower())
+    head, sep, _ = title.rpartition(" - ")
+    return head if sep and head else title
+
+
+class QuotaExceeded(Exception):
+    """Raised when the shared NewsAPI request budget is spent"""
+
+
+class RequestQuota:
+    """Rolling-window request budget shared by every NewsAPI call.
+
+    With `path`, the request timestamps live in a small JSON file updated
+    under an flock, so all gunicorn workers draw from one budget and a
+    restart does not reset it. Without it (or without fcntl) the budget is
+    per process.
+    """
+
+    def __init__(self, limit, window_seconds, path=None):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.timestamps = []
+        self.lock = threading.Lock()
+        if path and fcntl is None:
+            logger.warning("fcntl unavailable; NewsAPI quota is tracked per process")
+            path = None
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _load(self):
+        if not self.path:
+            return self.timestamps
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save(self, timestamps):
+        if not self.path:
+            self.timestamps = timestamps
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(timestamps, f)
+        os.replace(tmp_path, self.path)
+
+    def _locked(self):
+        return _QuotaFileLock(f"{self.path}.lock") if self.path else _NoLock()
+
+    def try_acquire(self):
+        # Wall-clock time, since timestamps are shared across processes and restarts
+        now = time.time()
+        with self.lock, self._locked():
+            cutoff = now - self.window_seconds
+            timestamps = [t for t in self._load() if t > cutoff]
+            if len(timestamps) >= self.limit:
+                self._save(timestamps)
+                return False
+            timestamps.append(now)
+            self._save(timestamps)
+            return True
+
+    def remaining(self):
+        cutoff = time.time() - self.window_seconds
+        with self.lock, self._locked():
+            return self.limit - sum(1 for t in self._load() if t > cutoff)
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _QuotaFileLock:
+    """Exclusive flock so workers read-modify-write the quota file one at a time"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, "a")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+
+class HeadlineAggregator:
+    """Fan NewsAPI requests out under a global concurrency limit and quota.
+
+    `fetch_page(query, page, page_size, published_after)` returns the raw
+    article list for one page; `process_article(article)` turns a raw article
+    into the app's headline dict (or None to skip it).
+    """
+
+    def __init__(self, fetch_page, process_article, max_concurrency=8, quota=None):
+        self.fetch_page = fetch_page
+        self.process_article = process_article
+        self.max_concurrency = max_concurrency
+        # One semaphore across all concurrent stream() calls
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.quota = quota
+
+    def _fetch(self, query, page, page_size, published_after):
+        with self.slots:
+            return self.fetch_page(query, page, page_size, published_after)
+
+    def fetch(self, query, page=1, page_size=6, published_after=None):
+        """One page outside stream(), still counted against the shared concurrency and quota"""
+        if self.quota is not None and not self.quota.try_acquire():
+            raise QuotaExceeded("NewsAPI request quota exhausted")
+        return self._fetch(query, page, page_size, published_after)
+
+    def stream(self, queries, pages=1, page_size=50, cursors=None, max_requests=None, incomplete=None):
+        """Yield deduped headline dicts across all queries as pages arrive.
+
+        Page N+1 of a query is only requested once page N came back full, so
+        sparse topics do not spend quota on empty pages.
+
+        `cursors` maps a query to the newest publishedAt the client has already
+        seen; only strictly newer articles are fetched for it. Once the stream
+        is fully consumed, a query's cursor is advanced only if its pagination
+        finished (a short last page, with nothing skipped or failed). Otherwise
+        newer-but-unfetched articles would sit between the old cursor and the
+        cut-off and never be fetched again, so the cursor is left as sent and
+        the query is added to the `incomplete` set, if one is given.
+        """
+        seen_urls = set()
+        seen_titles = set()
+        requests_made = 0
+        if cursors is None:
+            cursors = {}
+        if incomplete is None:
+            incomplete = set()
+        # Filter against the cursors as sent, not as advanced during this call
+        since = dict(cursors)
+        newest = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending = {}
+
+            def submit(query, page):
+                nonlocal requests_made
+                if max_requests is not None and requests_made >= max_requests:
+                    incomplete.add(query)
+                    return
+                if self.quota is not None and not self.quota.try_acquire():
+                    logger.warning(f"NewsAPI quota exhausted, skipping '{query}' page {page}")
+                    incomplete.add(query)
+                    return
+                requests_made += 1
+                future = pool.submit(self._fetch, query, page, page_size, since.get(query))
+                pending[future] = (query, page)
+
+            for query in dict.fromkeys(queries):
+                submit(query, 1)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    query, page = pending.pop(future)
+                    try:
+                        articles = future.result()
+                    except Exception as e:
+                        logger.error(f"Error fetching '{query}' page {page}: {e}")
+                        incomplete.add(query)
+                        continue
+
+                    if len(articles) >= page_size:
+                        if page < pages:
+                            submit(query, page + 1)
+                        else:
+                            # Page cap reached on a full page; older new articles remain unfetched
+                            incomplete.add(query)
+
+                    cursor = since.get(query)
+                    for article in articles:
+                        published_at = article.get("publishedAt") or ""
+                        # `from` is inclusive, so drop anything not strictly newer
+                        if cursor and published_at <= cursor:
+                            continue
+                        headline = self.process_article(article)
+                        if headline is None:
+                            continue
+
+                        url_key = normalize_url(article.get("url"))
+                        title_key = normalize_title(headline["title"])
+                        if not ((url_key and url_key in seen_urls) or title_key in seen_titles):
+                            if url_key:
+                                seen_urls.add(url_key)
+                            seen_titles.add(title_key)
+                            headline["query"] = query
+                            yield headline
+
+                        # Duplicates count too; they were already sent under another query
+                        if published_at > newest.get(query, ""):
+                            newest[query] = published_at
+
+        for query, published_at in newest.items():
+            if query not in incomplete and published_at > (cursors.get(query) or ""):
+                cursors[query] = published_at
@@ -0,0 +1,92 @@
+# student_model.py
+"""Hashed n-gram linear classifier distilled from the fine-tuned DistilBERT model.
+
+The student is deliberately dependency-free so the Flask app can load it
+without torch or transformers. distill_model.py trains it and save() writes
+a single JSON file that load() reads back.
+"""
+import json
+import math
+import re
+import zlib
+
+STUDENT_FORMAT_VERSION = 1
+DEFAULT_NUM_BUCKETS = 2 ** 18
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Labels follow train_model.py: 0 = Fake.csv, 1 = True.csv
+LABEL_NAMES = {0: "FAKE", 1: "REAL"}
+
+
+def tokenize(text):
+    """Lowercase word tokens, matching what the student was trained on"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def hashed_features(text, num_buckets=DEFAULT_NUM_BUCKETS, ngram_range=(1, 2)):
+    """Map text to a list of bucket ids for its word n-grams"""
+    tokens = tokenize(text)
+    features = []
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        for i in range(len(tokens) - n + 1):
+            gram = " ".join(tokens[i:i + n])
+            features.append(zlib.crc32(gram.encode("utf-8")) % num_buckets)
+    return features
+
+
+class StudentClassifier:
+    """Logistic regression over hashed word n-grams, scoring P(REAL)"""
+
+    def __init__(self, weights, bias=0.0, num_buckets=DEFAULT_NUM_BUCKETS,
+                 ngram_range=(1, 2), teacher=None):
+        self.weights = weights
+        self.bias = bias
+        self.num_buckets = num_buckets
+        self.ngram_range = tuple(ngram_range)
+        self.teacher = teacher
+
+    def real_probability(self, text):
+        features = hashed_features(text, self.num_buckets, self.ngram_range)
+        logit = self.bias + sum(self.weights.get(f, 0.0) for f in features)
+        # Clamp so math.exp cannot overflow on extreme logits
+        logit = max(min(logit, 30.0), -30.0)
+        return 1.0 / (1.0 + math.exp(-logit))
+
+    def predict(self, text):
+        """Return (label, confidence) in the same shape as hf_predict"""
+        if not text:
+            return "UNVERIFIED", 0.0
+        p_real = self.real_probability(text)
+        if p_real >= 0.5:
+            return LABEL_NAMES[1], round(p_real * 100, 2)
+        return LABEL_NAMES[0], round((1.0 - p_real) * 100, 2)
+
+    def save(self, path):
+        payload = {
+            "format_version": STUDENT_FORMAT_VERSION,
+            "type": "hashed_ngram_logreg",
+            "num_buckets": self.num_buckets,
+            "ngram_range": list(self.ngram_range),
+            "bias": self.bias,
+            "teacher": self.teacher,
+            # Only non-zero buckets are stored; most of the hash space is empty
+            "weights": {str(k): round(v, 6) for k, v in self.weights.items() if v != 0.0},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+
+def load(path):
+    """Load a StudentClassifier saved by StudentClassifier.save"""
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    if payload.get("format_version") != STUDENT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported student model format: {payload.get('format_version')}")
+    return StudentClassifier(
+        weights={int(k): v for k, v in payload["weights"].items()},
+        bias=payload.get("bias", 0.0),
+        num_buckets=payload["num_buckets"],
+        ngram_range=payload.get("ngram_range", (1, 2)),
+        teacher=payload.get("teacher"),
+    )